@@ -3,8 +3,14 @@
 
 import os
 import json
+import hmac
+import time
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
 from random import randint
-import math
+from functools import lru_cache, wraps
 import numpy as np
 import dash
 from dash.dependencies import Input, Output, State
@@ -12,13 +18,255 @@ import plotly.graph_objs as go
 from dash import dcc, html, dash_table
 import dash_dangerously_set_inner_html
 import pandas as pd
+import flask
+
+# Opt-in memory profiling: set PROFILE_MEMORY to record peak memory and growth
+# around each callback and the dataset load, and to compare the top allocation
+# sites against a snapshot taken once the app is set up.  The report is served
+# to requests carrying PROFILE_MEMORY_TOKEN in an X-Admin-Token header, and/or
+# written to PROFILE_MEMORY_DUMP ("{pid}" is replaced by the worker's pid)
+# every PROFILE_MEMORY_INTERVAL seconds.
+profile_memory = bool(os.getenv("PROFILE_MEMORY"))
+memory_profiles = deque(maxlen=200)
+memory_baseline = None
+if profile_memory:
+    tracemalloc.start()
+
+
+@contextmanager
+def memory_profile(name):
+    """Record peak memory and net growth for the enclosed block.
+
+    Only the traced totals are read, so this is cheap enough to leave on.
+    Peaks are process-wide, so concurrent requests show up in each other's
+    numbers; run a single worker thread for precise per-callback figures.
+    """
+    if not profile_memory:
+        yield
+        return
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    started = time.time()
+    try:
+        yield
+    finally:
+        seconds = time.time() - started
+        current, peak = tracemalloc.get_traced_memory()
+        memory_profiles.append(
+            {
+                "name": name,
+                "time": started,
+                "seconds": round(seconds, 4),
+                "growth_kib": round((current - start) / 1024, 1),
+                "peak_kib": round((peak - start) / 1024, 1),
+                "traced_kib": round(current / 1024, 1),
+            }
+        )
+
+
+def profiled(func):
+    """Wrap a callback in memory_profile when profiling is enabled."""
+    if not profile_memory:
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with memory_profile(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def top_allocation_sites(limit=10):
+    """Compare a fresh snapshot to the baseline to find long-run growth.
+
+    Taking a snapshot walks the whole traced heap, so this runs only for the
+    admin report and the periodic dump, never per callback.
+    """
+    if memory_baseline is None:
+        return []
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+    return [
+        {
+            "site": str(stat.traceback[0]),
+            "size_kib": round(stat.size_diff / 1024, 1),
+            "count": stat.count_diff,
+        }
+        for stat in snapshot.compare_to(memory_baseline, "lineno")[:limit]
+    ]
+
+
+def memory_report():
+    """Latest per-call records plus the top allocation sites since startup."""
+    return {"calls": list(memory_profiles), "top_sites": top_allocation_sites()}
+
+
+def write_memory_report(path):
+    """Write the memory report to a JSON file."""
+    with open(path.format(pid=os.getpid()), "w") as f:
+        json.dump(memory_report(), f)
+
+
+def dump_memory_profiles(path, interval):
+    """Periodically write the memory report to a JSON file."""
+    while True:
+        time.sleep(interval)
+        write_memory_report(path)
 
 
 mapbox_access_token = os.environ["MAPBOX_ACCESS_TOKEN"]
-communities = pd.read_csv("Data.csv")
+with memory_profile("load Data.csv"):
+    communities = pd.read_csv("Data.csv", keep_default_na=False)
 names = communities["Community"]
 path_prefix = os.environ["DASH_REQUESTS_PATHNAME_PREFIX"]
 
+# The five ranked categories that are summed into the Rating Score
+categories = [
+    "Massive Ice",
+    "Thaw Susceptibility",
+    "Existing Problems",
+    "Permafrost Occurrence",
+    "Permafrost Temperature",
+]
+level_names = np.array(["None", "Low", "Medium", "High"])
+
+# Earlier assessments live in vintages/<name>.csv with the Data.csv columns.
+# Data.csv is the current vintage and the base every other one is stored
+# against: only rows that differ from it are kept, unchanged rows are shared.
+current_vintage = "Current"
+vintage_dir = "vintages"
+
+
+def load_vintage_delta(path):
+    """Read an earlier Data.csv and keep only what differs from the base."""
+    old = pd.read_csv(path, keep_default_na=False).set_index("Community", drop=False)
+    base = communities.set_index("Community", drop=False)[old.columns]
+    shared = old.index.intersection(base.index)
+    differs = (old.loc[shared] != base.loc[shared]).any(axis=1)
+    added = old.index.difference(base.index)
+    return {
+        "rows": pd.concat([old.loc[shared[differs.to_numpy()]], old.loc[added]]),
+        "dropped": base.index.difference(old.index),
+    }
+
+
+vintages = {current_vintage: None}
+if os.path.isdir(vintage_dir):
+    for filename in sorted(os.listdir(vintage_dir), reverse=True):
+        if filename.endswith(".csv"):
+            with memory_profile("load " + filename):
+                vintages[filename[:-4]] = load_vintage_delta(
+                    os.path.join(vintage_dir, filename)
+                )
+
+
+# Only the viewed and the compared vintage are kept rebuilt at a time
+@lru_cache(maxsize=2)
+def get_vintage(vintage):
+    """Rebuild a full communities frame for a vintage from its delta."""
+    delta = vintages[vintage]
+    if delta is None:
+        return communities
+    replaced = communities["Community"].isin(delta["rows"].index)
+    dropped = communities["Community"].isin(delta["dropped"])
+    frame = pd.concat([communities[~(replaced | dropped)], delta["rows"]])
+    return frame.sort_values("Community").reset_index(drop=True)
+
+
+@lru_cache(maxsize=16)
+def diff_vintages(old, new):
+    """List the communities and category ranks that changed between vintages.
+
+    Returns a frame of Community, Change ("changed", "added" or "dropped"),
+    Category, Old and New.  Changed ranks get one row per category; added and
+    dropped communities get a single row with no Category and the missing side
+    left empty.  Results are cached per pair, so treat them as read-only.
+    """
+    candidates = set()
+    for vintage in (old, new):
+        if vintages[vintage] is not None:
+            candidates.update(vintages[vintage]["rows"].index)
+    old_ranks = get_vintage(old).set_index("Community")[categories]
+    new_ranks = get_vintage(new).set_index("Community")[categories]
+    shared = old_ranks.index.intersection(new_ranks.index)
+    shared = shared[shared.isin(candidates)]
+    old_values = old_ranks.loc[shared].to_numpy()
+    new_values = new_ranks.loc[shared].to_numpy()
+    rows, cols = np.nonzero(old_values != new_values)
+    changed = pd.DataFrame(
+        {
+            "Community": shared[rows],
+            "Change": "changed",
+            "Category": np.asarray(categories)[cols],
+            "Old": old_values[rows, cols],
+            "New": new_values[rows, cols],
+        }
+    )
+    added = new_ranks.index.difference(old_ranks.index)
+    dropped = old_ranks.index.difference(new_ranks.index)
+    moved = pd.DataFrame(
+        {
+            "Community": added.append(dropped),
+            "Change": ["added"] * len(added) + ["dropped"] * len(dropped),
+        }
+    )
+    diff = pd.concat([changed, moved], ignore_index=True)
+    return diff.astype({"Old": "Int64", "New": "Int64"})
+
+
+def cache_clear():
+    """Drop the cached vintages, diffs and scenarios."""
+    get_vintage.cache_clear()
+    diff_vintages.cache_clear()
+    score_scenario.cache_clear()
+
+
+# Published scoring: equal weights, Medium from 9, High from 12
+default_weights = (1.0, 1.0, 1.0, 1.0, 1.0)
+default_thresholds = (9.0, 12.0)
+
+
+def scenario_key(vintage, weights, thresholds):
+    """Normalize slider values to a hashable parameter set for the cache."""
+    vintage = current_vintage if vintage is None else vintage
+    thresholds = default_thresholds if thresholds is None else thresholds
+    # Sliders without a value fall back to the published scoring one by one
+    return (
+        vintage,
+        tuple(
+            float(default if w is None else w)
+            for w, default in zip(weights, default_weights)
+        ),
+        tuple(
+            sorted(
+                float(default if t is None else t)
+                for t, default in zip(thresholds, default_thresholds)
+            )
+        ),
+    )
+
+
+@lru_cache(maxsize=64)
+def score_scenario(vintage, weights, thresholds):
+    """Recompute Rating Score and Risk Index for all communities at once.
+
+    Returns the scores and risk indexes (0 - 3, None to High) in the row order
+    of the vintage's frame.  Only these arrays are cached per parameter set,
+    not frames, and they are read-only.
+    """
+    ranks = get_vintage(vintage)[categories].to_numpy(dtype=float)
+    scores = ranks @ np.asarray(weights, dtype=float)
+    levels = np.searchsorted(thresholds, scores, side="right") + 1
+    # A Rating Score of 0 (no permafrost, or only zero-weighted ranks) is None
+    levels[scores <= 0] = 0
+
+    if np.all(scores == np.round(scores)):
+        scores = scores.astype(int)
+    scores.flags.writeable = False
+    levels.flags.writeable = False
+    return scores, levels
+
 
 app = dash.Dash(__name__)
 
@@ -27,6 +275,29 @@ app = dash.Dash(__name__)
 application = app.server
 app.title = "SNAP - Community Permafrost Data"
 
+
+@application.route(app.config.routes_pathname_prefix + "admin/memory")
+def admin_memory():
+    """Admin-only view of the memory profiling report."""
+    expected = os.getenv("PROFILE_MEMORY_TOKEN")
+    if not profile_memory or not expected:
+        flask.abort(404)
+    token = flask.request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token.encode(), expected.encode()):
+        flask.abort(403)
+    return flask.jsonify(memory_report())
+
+
+if profile_memory and os.getenv("PROFILE_MEMORY_DUMP"):
+    threading.Thread(
+        target=dump_memory_profiles,
+        args=(
+            os.environ["PROFILE_MEMORY_DUMP"],
+            float(os.getenv("PROFILE_MEMORY_INTERVAL", default=300)),
+        ),
+        daemon=True,
+    ).start()
+
 app.index_string = f"""
 <!DOCTYPE html>
 <html>
@@ -109,6 +380,95 @@ risk_type = html.Div(
     ],
 )
 
+# What-if scenario controls: per-category weights and risk level cut points
+weight_inputs = [
+    Input("weight-" + i.lower().replace(" ", "-"), "value") for i in categories
+]
+scenario = html.Div(
+    className="field",
+    children=[
+        html.Label("Adjust category weights and risk thresholds to explore scenarios"),
+        html.Div(
+            className="control",
+            children=[
+                html.Div(
+                    children=[
+                        html.Small(cat),
+                        dcc.Slider(
+                            id=weight.component_id,
+                            min=0,
+                            max=3,
+                            step=0.5,
+                            value=default_weights[i],
+                            marks={w: str(w) for w in range(4)},
+                        ),
+                    ]
+                )
+                for i, (cat, weight) in enumerate(zip(categories, weight_inputs))
+            ]
+            + [
+                html.Small("Medium / High risk thresholds (Rating Score)"),
+                dcc.RangeSlider(
+                    id="thresholds",
+                    min=1,
+                    max=45,
+                    step=0.5,
+                    value=list(default_thresholds),
+                    marks={t: str(t) for t in range(5, 46, 5)},
+                    allowCross=False,
+                ),
+            ],
+        ),
+    ],
+)
+scenario_inputs = (
+    [Input("vintage", "value")] + weight_inputs + [Input("thresholds", "value")]
+)
+
+
+def scenario_from_inputs(vintage, *values):
+    """Score a vintage's communities for the weight sliders and thresholds.
+
+    Returns a copy of the vintage's frame with the scenario's "Rating Score",
+    "Risk Level" and "Risk Index" columns.
+    """
+    key = scenario_key(vintage, values[:-1], values[-1])
+    scores, levels = score_scenario(*key)
+    return get_vintage(key[0]).assign(
+        **{
+            "Rating Score": scores,
+            "Risk Level": level_names[levels],
+            "Risk Index": levels,
+        }
+    )
+
+
+# Assessment vintage to view, and an optional earlier one to highlight changes
+vintage_options = [{"label": name, "value": name} for name in vintages]
+vintage = html.Div(
+    className="field",
+    children=[
+        html.Label("Select an assessment, and optionally one to compare it to"),
+        html.Div(
+            className="control",
+            children=[
+                dcc.Dropdown(
+                    id="vintage",
+                    options=vintage_options,
+                    value=current_vintage,
+                    clearable=False,
+                ),
+                dcc.Dropdown(
+                    id="compare_vintage",
+                    options=vintage_options,
+                    placeholder="Highlight changes since...",
+                ),
+            ],
+        ),
+    ],
+)
+
+
 # Set defaults for map load.
 risk_level = communities["Risk Level"]
 risk_color = []
@@ -123,7 +483,7 @@ for i in risk_level:
         risk_color.append("#808080")
 
 # Concat risk level with community for hover titles
-communities["Hover Title"] = communities[["Community", "Risk Level"]].apply(
+hover_title = communities[["Community", "Risk Level"]].apply(
     lambda x: ": ".join(str(x)), axis=1
 )
 
@@ -132,7 +492,7 @@ map_communities_trace = go.Scattermapbox(
     lon=communities["Longitude"],
     mode="markers",
     marker={"size": 15, "color": risk_color},
-    text=communities["Hover Title"],
+    text=hover_title,
     hoverinfo="text",
 )
 
@@ -459,6 +819,12 @@ Explore permafrost risks and hazards for rural communities in Alaska based on ma
                                         html.Div(
                                             className="column", children=[community]
                                         ),
+                                        html.Div(
+                                            className="column", children=[vintage]
+                                        ),
+                                        html.Div(
+                                            className="column", children=[scenario]
+                                        ),
                                     ],
                                 ),
                                 html.Div(
@@ -540,63 +906,116 @@ color_lu = {
 }
 
 
-# Callback for map object when risk_type dropdown is changed
-@app.callback(Output("map", "figure"), [Input("risk_type", "value")])
-def update_map_colors(risktype):
-    risk_level = communities[risktype]
-    risk_color = []
+# Changed cells and added rows are highlighted in the data table, dropped
+# communities are shown in these colors on the map and in the table
+changed_color = "#fbe3a1"
+dropped_color = "#808080"
+dropped_table_color = "#e0e0e0"
+
+
+def vintage_changes(compare, vintage):
+    """Diff the viewed vintage against the compared one, if any is selected."""
+    vintage = current_vintage if vintage is None else vintage
+    if compare is None or compare == vintage:
+        return None
+    return diff_vintages(compare, vintage)
+
+
+# Callback for map object when risk_type dropdown or scenario is changed
+@app.callback(
+    Output("map", "figure"),
+    [Input("risk_type", "value"), Input("compare_vintage", "value")] + scenario_inputs,
+)
+@profiled
+def update_map_colors(risktype, compare, *scenario_values):
+    scored = scenario_from_inputs(*scenario_values)
+    # Risk Level and the categories both index None / Low / Medium / High as 0 - 3
     if risktype == "Risk Level":
-        # Create new labels / color map based on selected risktype and community
-        newcomm_labels = communities[["Community", "Risk Level"]].apply(
-            lambda x: ": ".join(x.dropna().astype(str)), axis=1
-        )
-        for i in risk_level:
-            if i == "None":
-                risk_color.append(color_lu[risktype]["None"])
-            if i == "Low":
-                risk_color.append(color_lu[risktype]["Low"])
-            if i == "Medium":
-                risk_color.append(color_lu[risktype]["Medium"])
-            if i == "High":
-                risk_color.append(color_lu[risktype]["High"])
+        risk_index = scored["Risk Index"]
+        labels = scored["Risk Level"]
     else:
-        # Create new labels / color map based on selected risktype and community
-        newcomm_labels = communities[["Community", risktype + " Label"]].apply(
-            lambda x: ": ".join(x.dropna().astype(str)), axis=1
+        risk_index = scored[risktype]
+        labels = scored[risktype + " Label"]
+    palette = np.array([color_lu[risktype][name] for name in level_names])
+    risk_color = palette[risk_index.to_numpy()].tolist()
+
+    # Create new labels based on selected risktype and community
+    newcomm_labels = scored["Community"] + ": " + labels
+    marker = {"size": 15, "color": risk_color}
+
+    # Enlarge communities that changed since the compared vintage, fade others
+    changes = vintage_changes(compare, scenario_values[0])
+    if changes is not None:
+        status = changes.drop_duplicates("Community").set_index("Community")
+        status = scored["Community"].map(status["Change"])
+        changed = status.notna().to_numpy()
+        marker["size"] = np.where(changed, 22, 12).tolist()
+        marker["opacity"] = np.where(changed, 1.0, 0.35).tolist()
+        newcomm_labels = newcomm_labels.where(
+            ~changed, newcomm_labels + " (" + status + ")"
         )
-        for i in risk_level:
-            if i == 0:
-                risk_color.append(color_lu[risktype]["None"])
-            if i == 1:
-                risk_color.append(color_lu[risktype]["Low"])
-            if i == 2:
-                risk_color.append(color_lu[risktype]["Medium"])
-            if i == 3:
-                risk_color.append(color_lu[risktype]["High"])
 
     map_communities_trace = go.Scattermapbox(
-        lat=communities["Latitude"],
-        lon=communities["Longitude"],
+        lat=scored["Latitude"],
+        lon=scored["Longitude"],
         mode="markers",
-        marker={"size": 15, "color": risk_color},
+        marker=marker,
         text=newcomm_labels,
         hoverinfo="text",
     )
     figure = {"data": [map_communities_trace], "layout": map_layout}
+
+    # Communities dropped since the compared vintage are drawn at their old spot
+    if changes is not None and (changes["Change"] == "dropped").any():
+        compared = get_vintage(compare)
+        dropped = compared[
+            compared["Community"].isin(
+                changes.loc[changes["Change"] == "dropped", "Community"]
+            )
+        ]
+        figure["data"].append(
+            go.Scattermapbox(
+                lat=dropped["Latitude"],
+                lon=dropped["Longitude"],
+                mode="markers",
+                marker={"size": 22, "color": dropped_color},
+                text=dropped["Community"] + ": (dropped)",
+                hoverinfo="text",
+            )
+        )
     return figure
 
 
+# Offer the communities of the viewed vintage, plus those of the compared one
+# so that communities dropped since then can still be selected
+@app.callback(
+    Output("community", "options"),
+    [Input("vintage", "value"), Input("compare_vintage", "value")],
+)
+@profiled
+def update_community_options(vintage, compare):
+    vintage = current_vintage if vintage is None else vintage
+    options = set(get_vintage(vintage)["Community"])
+    if compare is not None:
+        options.update(get_vintage(compare)["Community"])
+    return [{"label": name, "value": name} for name in sorted(options)]
+
+
 # Update selected community based on map marker click
 @app.callback(
     Output("community", "value"),
     [Input("map", "clickData")],
     [State("community", "value")],
 )
+@profiled
 def update_site_dropdown(selected_on_map, comm_state):
     """If user clicks on the map, update the drop down."""
     if selected_on_map is not None:
         # Return community name
         comm_val = selected_on_map["points"][0]["text"].split(":")[0]
+        # The dropdown starts out with a single string value
+        if type(comm_state) == str:
+            comm_state = [comm_state]
         if comm_val not in comm_state:
             comm_state.append(comm_val)
         return comm_state
@@ -604,29 +1023,64 @@ def update_site_dropdown(selected_on_map, comm_state):
     return ["Nome"]
 
 
-# Update data table when new community is selected
-@app.callback([Output("community-table", "data")], inputs=[Input("community", "value")])
-def update_graph(community):
+# Update data table when new community or scenario is selected
+@app.callback(
+    [
+        Output("community-table", "data"),
+        Output("community-table", "style_data_conditional"),
+    ],
+    inputs=[Input("community", "value"), Input("compare_vintage", "value")]
+    + scenario_inputs,
+)
+@profiled
+def update_graph(community, compare, *scenario_values):
+    scored = scenario_from_inputs(*scenario_values)
     commarray = {}
     if type(community) == str:
-        commarray = communities[communities["Community"] == community]
+        commarray = scored[scored["Community"] == community]
     else:
         for i, obj in enumerate(community):
             if i == 0:
-                commarray = communities[communities["Community"] == obj]
+                commarray = scored[scored["Community"] == obj]
             else:
-                commarray = pd.concat(
-                    [commarray, communities[communities["Community"] == obj]]
-                )
-    return [commarray.to_dict("records")]
+                commarray = pd.concat([commarray, scored[scored["Community"] == obj]])
+
+    # Highlight category cells that changed since the compared vintage, and
+    # whole rows for added communities and dropped ones (from the old vintage)
+    styles = []
+    changes = vintage_changes(compare, scenario_values[0])
+    if changes is not None:
+        selected = [community] if type(community) == str else community
+        changes = changes[changes["Community"].isin(selected)]
+        dropped = changes.loc[changes["Change"] == "dropped", "Community"]
+        if len(dropped):
+            compared = scenario_from_inputs(compare, *scenario_values[1:])
+            commarray = pd.concat(
+                [commarray, compared[compared["Community"].isin(dropped)]]
+            )
+        for comm, change, cat in zip(
+            changes["Community"], changes["Change"], changes["Category"]
+        ):
+            style = {"if": {"filter_query": '{Community} = "' + comm + '"'}}
+            if change == "changed":
+                style["if"]["column_id"] = cat + " Table"
+            if change == "dropped":
+                style["backgroundColor"] = dropped_table_color
+                style["textDecoration"] = "line-through"
+            else:
+                style["backgroundColor"] = changed_color
+            styles.append(style)
+    return [commarray.to_dict("records"), styles]
 
 
-# Update main plot based on community selections
+# Update main plot based on community and scenario selections
 @app.callback(
     Output("weather-plot", "figure"),
-    inputs=[Input("community", "value"), Input("risk_type", "value")],
+    inputs=[Input("community", "value"), Input("risk_type", "value")] + scenario_inputs,
 )
-def make_plot(community, risktype):
+@profiled
+def make_plot(community, risktype, *scenario_values):
+    scored = scenario_from_inputs(*scenario_values)
     figure = {}
     figure["data"] = []
 
@@ -646,11 +1100,16 @@ def make_plot(community, risktype):
             if hazard_lu[i] != risktype:
                 marker_colors[i] = "#808080"
 
+    # The dropdown starts out with a single string value
+    if type(community) == str:
+        community = [community]
+
     for i in community:
-        if type(community) == str:
-            df = communities[communities["Community"] == community].iloc[0]
-        else:
-            df = communities[communities["Community"] == i].iloc[0]
+        df = scored[scored["Community"] == i]
+        if df.empty:
+            # Community is not part of the selected vintage
+            continue
+        df = df.iloc[0]
 
         marker_texts = []
         marker_size_vals = []
@@ -658,18 +1117,12 @@ def make_plot(community, risktype):
             # Risk Level / Rating Score have different column rules
             if i == "Risk Level":
                 marker_texts.append("<b>" + df["Risk Level"] + "</b>")
-                marker_size_vals.append(df["Rating Score"])
+                # Scenario risk index runs 0 - 3 from None to High
+                marker_size_vals.append(df["Risk Index"])
             else:
                 marker_texts.append("<b>" + df[i + " Label"] + "</b>")
                 marker_size_vals.append(df[i])
 
-        if marker_size_vals[5] == 0:
-            # Leave marker size if 0
-            marker_size_vals[5] = 0
-        else:
-            # Normalize Risk Score from 0 - 3 from None, 6-15
-            # 6-8 = Low, 9-12 = Medium, 13+ = High
-            marker_size_vals[5] = math.ceil((marker_size_vals[5] - 5) / 3)
         marker_sizes = [x * 1.2 + 0.25 for x in marker_size_vals]
 
         # Create trace for each community, to fit on one line
@@ -739,5 +1192,12 @@ def make_plot(community, risktype):
     return figure
 
 
+# Allocation sites are reported as growth since the app finished setting up
+if profile_memory:
+    memory_baseline = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    )
+
+
 if __name__ == "__main__":
     application.run(debug=os.getenv("FLASK_DEBUG", default=False), port=8080)
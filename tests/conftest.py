@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+# application.py reads its settings and Data.csv at import time, so pin dummy
+# values (the token ends up in the map layout) and run from the repo root.
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["MAPBOX_ACCESS_TOKEN"] = "dummy-mapbox-token"
+os.environ["DASH_REQUESTS_PATHNAME_PREFIX"] = "/"
+os.environ.pop("PROFILE_MEMORY", None)
+os.chdir(root)
+sys.path.insert(0, root)
+
+# Data.csv with Nome's Massive Ice raised from 2 to 3, Bethel missing and a
+# made-up community, Newville, added
+vintage_path = os.path.join(root, "tests", "vintages", "2019.csv")
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-golden",
+        action="store_true",
+        help="Rewrite tests/golden from the current callback outputs.",
+    )
+
+
+@pytest.fixture(scope="session")
+def update_golden(request):
+    return request.config.getoption("--update-golden")
+
+
+@pytest.fixture
+def vintage_2019():
+    """Register tests/vintages/2019.csv as the "2019" vintage for one test."""
+    import application
+
+    application.vintages["2019"] = application.load_vintage_delta(vintage_path)
+    application.cache_clear()
+    yield "2019"
+    del application.vintages["2019"]
+    application.cache_clear()
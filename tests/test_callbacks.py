@@ -0,0 +1,184 @@
+"""Golden-output equivalence and performance budgets for the app callbacks.
+
+Outputs are compared against tests/golden/<callback>.json, captured from the
+reference implementation with `pytest --update-golden`.  To check an
+alternative implementation, point CALLBACK_IMPL at a module exposing the same
+callback functions, e.g. `CALLBACK_IMPL=fast_callbacks pytest`.
+"""
+
+import copy
+import importlib
+import json
+import math
+import os
+import time
+
+import plotly
+import pytest
+
+golden_dir = os.path.join(os.path.dirname(__file__), "golden")
+
+risk_types = [
+    "Risk Level",
+    "Massive Ice",
+    "Thaw Susceptibility",
+    "Existing Problems",
+    "Permafrost Occurrence",
+    "Permafrost Temperature",
+]
+risk_cases = {"risk-" + risk.lower().replace(" ", "-"): risk for risk in risk_types}
+
+# Scenario inputs: vintage, the five category weights and the thresholds
+published = ("Current", 1, 1, 1, 1, 1, [9, 12])
+reweighted = ("Current", 2, 1, 1, 1, 1.5, [10, 14])
+
+# Akhiok has no permafrost and a Rating Score of 0
+cases = {
+    "update_map_colors": {
+        **{case: (risk, None) + published for case, risk in risk_cases.items()},
+        "reweighted": ("Risk Level", None) + reweighted,
+    },
+    "update_graph": {
+        "single-string": ("Nome", None) + published,
+        "single-list": (["Nome"], None) + published,
+        "multiple": (["Nome", "Akhiok", "Kotzebue"], None) + published,
+        "zero-score": (["Akhiok"], None) + published,
+        "reweighted": (["Nome", "Bethel"], None) + reweighted,
+    },
+    "make_plot": {
+        "single-string": ("Nome", "Risk Level") + published,
+        **{
+            case: (["Nome", "Akhiok"], risk) + published
+            for case, risk in risk_cases.items()
+        },
+        "zero-score": (["Akhiok"], "Risk Level") + published,
+        "reweighted": (["Nome", "Bethel"], "Risk Level") + reweighted,
+    },
+    "update_site_dropdown": {
+        "no-click": (None, ["Nome"]),
+        "click-new": ({"points": [{"text": "Kotzebue: Medium"}]}, ["Nome"]),
+        "click-selected": ({"points": [{"text": "Nome: High"}]}, ["Nome"]),
+        "click-zero-score": ({"points": [{"text": "Akhiok: None"}]}, ["Nome"]),
+        # The dropdown's initial value is a string, not a list
+        "click-string-state": ({"points": [{"text": "Kotzebue: Medium"}]}, "Nome"),
+    },
+}
+
+# Best-of-five wall time per call with the implementation's caches cleared
+# first (through its cache_clear hook, if any), so each run pays what a slider
+# move costs, and serialized size per output
+latency_budgets_ms = {
+    "update_map_colors": 25,
+    "update_graph": 25,
+    "make_plot": 25,
+    "update_site_dropdown": 5,
+}
+payload_budgets_kib = {
+    "update_map_colors": 16,
+    "update_graph": 4,
+    "make_plot": 6,
+    "update_site_dropdown": 1,
+}
+
+case_ids = [(name, case) for name in cases for case in cases[name]]
+
+# Compare mode against the tests/vintages/2019.csv fixture, budgeted only
+compare = ("2019", "Current", 1, 1, 1, 1, 1, [9, 12])
+compare_cases = {
+    "update_map_colors": ("Risk Level",) + compare,
+    "update_graph": (["Nome", "Bethel", "Newville", "Kotzebue"],) + compare,
+}
+
+
+@pytest.fixture(scope="session")
+def reference():
+    return importlib.import_module("application")
+
+
+@pytest.fixture(scope="session")
+def impl():
+    return importlib.import_module(os.getenv("CALLBACK_IMPL", default="application"))
+
+
+@pytest.fixture(scope="session")
+def golden(update_golden, reference):
+    """Load the golden outputs, or capture them first with --update-golden.
+
+    Goldens are always captured from the reference implementation, never from
+    the CALLBACK_IMPL under test.
+    """
+    outputs = {}
+    for name in cases:
+        path = os.path.join(golden_dir, name + ".json")
+        if update_golden:
+            captured = {
+                case: serialize(call(reference, name, args))
+                for case, args in cases[name].items()
+            }
+            with open(path, "w") as f:
+                json.dump(captured, f, indent=1, sort_keys=True)
+                f.write("\n")
+        with open(path) as f:
+            outputs[name] = json.load(f)
+    return outputs
+
+
+def call(impl, name, args):
+    # update_site_dropdown appends to its state, so hand out fresh copies
+    return getattr(impl, name)(*copy.deepcopy(args))
+
+
+def serialize(output):
+    """Round-trip an output through the JSON Dash sends to the browser."""
+    return json.loads(json.dumps(output, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+def assert_equivalent(actual, expected, path="output"):
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict), path
+        assert sorted(actual) == sorted(expected), path
+        for key in expected:
+            assert_equivalent(actual[key], expected[key], path + "." + key)
+    elif isinstance(expected, list):
+        assert isinstance(actual, list), path
+        assert len(actual) == len(expected), path
+        for i, (a, e) in enumerate(zip(actual, expected)):
+            assert_equivalent(a, e, "%s[%d]" % (path, i))
+    elif isinstance(expected, float) or isinstance(actual, float):
+        assert math.isclose(actual, expected, rel_tol=1e-9, abs_tol=1e-12), path
+    else:
+        assert actual == expected, path
+
+
+@pytest.mark.parametrize("name,case", case_ids)
+def test_matches_golden(impl, golden, name, case):
+    actual = serialize(call(impl, name, cases[name][case]))
+    assert_equivalent(actual, golden[name][case])
+
+
+@pytest.mark.parametrize("name,case", case_ids)
+def test_payload_budget(impl, name, case):
+    payload = json.dumps(
+        call(impl, name, cases[name][case]), cls=plotly.utils.PlotlyJSONEncoder
+    )
+    assert len(payload) / 1024 <= payload_budgets_kib[name]
+
+
+@pytest.mark.parametrize("name", compare_cases)
+def test_compare_payload_budget(impl, vintage_2019, name):
+    payload = json.dumps(
+        call(impl, name, compare_cases[name]), cls=plotly.utils.PlotlyJSONEncoder
+    )
+    assert len(payload) / 1024 <= payload_budgets_kib[name]
+
+
+@pytest.mark.parametrize("name,case", case_ids)
+def test_latency_budget(impl, name, case):
+    cache_clear = getattr(impl, "cache_clear", lambda: None)
+    timings = []
+    for _ in range(5):
+        cache_clear()
+        started = time.perf_counter()
+        call(impl, name, cases[name][case])
+        timings.append(time.perf_counter() - started)
+    assert min(timings) * 1000 <= latency_budgets_ms[name]
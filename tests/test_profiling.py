@@ -0,0 +1,110 @@
+"""Opt-in memory profiling hooks, admin report and periodic dump."""
+
+import json
+import os
+import tracemalloc
+from collections import deque
+
+import pytest
+
+import application
+
+
+@pytest.fixture
+def profiling(monkeypatch):
+    """Turn profiling on with a small ring buffer and a startup baseline."""
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    monkeypatch.setattr(application, "profile_memory", True)
+    monkeypatch.setattr(application, "memory_profiles", deque(maxlen=3))
+    monkeypatch.setattr(application, "memory_baseline", tracemalloc.take_snapshot())
+    yield
+    if not was_tracing:
+        tracemalloc.stop()
+
+
+def allocate():
+    return [bytearray(1024) for _ in range(100)]
+
+
+def test_profiled_is_a_no_op_when_disabled():
+    assert not application.profile_memory
+    assert application.profiled(allocate) is allocate
+    with application.memory_profile("disabled"):
+        pass
+    assert len(application.memory_profiles) == 0
+
+
+def test_profiled_records_peak_and_growth(profiling):
+    wrapped = application.profiled(allocate)
+    assert wrapped.__name__ == "allocate"
+    kept = wrapped()
+    (record,) = application.memory_profiles
+    assert sorted(record) == [
+        "growth_kib",
+        "name",
+        "peak_kib",
+        "seconds",
+        "time",
+        "traced_kib",
+    ]
+    assert record["name"] == "allocate"
+    assert record["peak_kib"] >= record["growth_kib"] >= 100
+    del kept
+
+
+def test_ring_buffer_keeps_latest_records(profiling):
+    for i in range(5):
+        with application.memory_profile("call %d" % i):
+            pass
+    assert [r["name"] for r in application.memory_profiles] == [
+        "call 2",
+        "call 3",
+        "call 4",
+    ]
+
+
+def test_top_sites_show_growth_since_baseline(profiling):
+    kept = allocate()
+    sites = application.top_allocation_sites()
+    assert sites and sorted(sites[0]) == ["count", "site", "size_kib"]
+    assert any(__file__ in site["site"] for site in sites)
+    del kept
+
+
+def test_admin_route(profiling, monkeypatch):
+    monkeypatch.setenv("PROFILE_MEMORY_TOKEN", "s3cret")
+    with application.memory_profile("request"):
+        pass
+    client = application.application.test_client()
+    assert client.get("/admin/memory").status_code == 403
+    wrong = {"X-Admin-Token": "wrong"}
+    assert client.get("/admin/memory", headers=wrong).status_code == 403
+    non_ascii = {"X-Admin-Token": "s3crét".encode().decode("latin-1")}
+    assert client.get("/admin/memory", headers=non_ascii).status_code == 403
+    response = client.get("/admin/memory", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    report = response.get_json()
+    assert [r["name"] for r in report["calls"]] == ["request"]
+    assert "top_sites" in report
+
+
+def test_admin_route_needs_profiling_and_token(monkeypatch):
+    client = application.application.test_client()
+    monkeypatch.setenv("PROFILE_MEMORY_TOKEN", "s3cret")
+    headers = {"X-Admin-Token": "s3cret"}
+    assert client.get("/admin/memory", headers=headers).status_code == 404
+    monkeypatch.setattr(application, "profile_memory", True)
+    monkeypatch.delenv("PROFILE_MEMORY_TOKEN")
+    assert client.get("/admin/memory", headers=headers).status_code == 404
+
+
+def test_write_memory_report(profiling, tmp_path):
+    with application.memory_profile("dumped"):
+        pass
+    application.write_memory_report(str(tmp_path / "memory-{pid}.json"))
+    path = tmp_path / ("memory-%d.json" % os.getpid())
+    report = json.loads(path.read_text())
+    assert [r["name"] for r in report["calls"]] == ["dumped"]
+    assert isinstance(report["top_sites"], list)
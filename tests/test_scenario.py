@@ -0,0 +1,71 @@
+"""Scoring rules of the what-if scenario engine."""
+
+import numpy as np
+import pandas as pd
+
+import application
+
+
+def score(weights=(1, 1, 1, 1, 1), thresholds=(9, 12), vintage="Current"):
+    return application.score_scenario(
+        *application.scenario_key(vintage, weights, thresholds)
+    )
+
+
+def test_default_weights_reproduce_data_csv():
+    data = pd.read_csv("Data.csv", keep_default_na=False)
+    scores, levels = score()
+    np.testing.assert_array_equal(scores, data["Rating Score"])
+    np.testing.assert_array_equal(application.level_names[levels], data["Risk Level"])
+
+
+def test_zero_weights_give_none_everywhere():
+    scores, levels = score(weights=(0, 0, 0, 0, 0))
+    assert (scores == 0).all()
+    assert (levels == 0).all()
+
+
+def test_zero_weighted_ranks_give_none(monkeypatch):
+    # Data.csv has no community ranked 0 in only some categories, so use a
+    # vintage where Nome has Massive Ice alone
+    nome = application.communities.set_index("Community", drop=False).loc[["Nome"]]
+    nome[application.categories] = [3, 0, 0, 0, 0]
+    monkeypatch.setitem(
+        application.vintages,
+        "massive-ice-only",
+        {"rows": nome, "dropped": pd.Index([])},
+    )
+    application.get_vintage.cache_clear()
+    application.score_scenario.cache_clear()
+    try:
+        scores, levels = score(weights=(0, 1, 1, 1, 1), vintage="massive-ice-only")
+        frame = application.get_vintage("massive-ice-only")
+    finally:
+        application.get_vintage.cache_clear()
+        application.score_scenario.cache_clear()
+    nome_row = (frame["Community"] == "Nome").to_numpy()
+    assert scores[nome_row].tolist() == [0]
+    assert application.level_names[levels[nome_row]].tolist() == ["None"]
+    assert ((scores == 0) == (levels == 0)).all()
+
+
+def test_score_on_threshold_lands_in_higher_level():
+    scores, levels = score()
+    for value, level in [(8, "Low"), (9, "Medium"), (11, "Medium"), (12, "High")]:
+        assert (scores == value).any()
+        assert set(application.level_names[levels[scores == value]]) == {level}
+
+
+def test_missing_slider_values_use_defaults():
+    assert application.scenario_key(None, (None, 2, None, 1, 1), [None, 14]) == (
+        "Current",
+        (1.0, 2.0, 1.0, 1.0, 1.0),
+        (9.0, 14.0),
+    )
+    assert application.scenario_key("Current", (1,) * 5, None)[2] == (9.0, 12.0)
+
+
+def test_cached_arrays_are_read_only():
+    scores, levels = score()
+    assert not scores.flags.writeable
+    assert not levels.flags.writeable
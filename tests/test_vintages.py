@@ -0,0 +1,117 @@
+"""Delta storage, diffs and compare-mode highlights for dataset vintages.
+
+tests/vintages/2019.csv is Data.csv with Nome's Massive Ice raised from 2 to
+3, Bethel missing and a made-up community, Newville, added.
+"""
+
+import os
+
+import pandas as pd
+
+import application
+
+vintage_path = os.path.join(os.path.dirname(__file__), "vintages", "2019.csv")
+
+published = (1, 1, 1, 1, 1, [9, 12])
+
+
+def test_delta_keeps_only_changed_rows(vintage_2019):
+    delta = application.vintages[vintage_2019]
+    assert sorted(delta["rows"].index) == ["Newville", "Nome"]
+    assert list(delta["dropped"]) == ["Bethel"]
+
+
+def test_rebuilt_vintage_matches_file(vintage_2019):
+    expected = pd.read_csv(vintage_path, keep_default_na=False)
+    rebuilt = application.get_vintage(vintage_2019)
+    assert list(rebuilt.columns) == list(application.communities.columns)
+    assert not rebuilt.isna().any().any()
+    pd.testing.assert_frame_equal(
+        rebuilt, expected.sort_values("Community").reset_index(drop=True)
+    )
+
+
+def test_diff_lists_changed_added_and_dropped(vintage_2019):
+    diff = application.diff_vintages(vintage_2019, "Current")
+    changed = diff[diff["Change"] == "changed"]
+    assert changed[["Community", "Category"]].values.tolist() == [
+        ["Nome", "Massive Ice"]
+    ]
+    assert changed[["Old", "New"]].values.tolist() == [[3, 2]]
+    moved = diff[diff["Change"] != "changed"]
+    assert moved[["Community", "Change"]].values.tolist() == [
+        ["Bethel", "added"],
+        ["Newville", "dropped"],
+    ]
+    assert moved["Category"].isna().all()
+    assert moved[["Old", "New"]].isna().all().all()
+
+
+def test_diff_against_itself_is_empty(vintage_2019):
+    assert application.diff_vintages(vintage_2019, vintage_2019).empty
+
+
+def test_map_highlights_changes(vintage_2019):
+    figure = application.update_map_colors(
+        "Risk Level", vintage_2019, "Current", *published
+    )
+    current, dropped = figure["data"]
+    labels = dict(zip(current.text, current.marker.size))
+    assert labels["Nome: High (changed)"] == 22
+    assert labels["Bethel: Medium (added)"] == 22
+    assert labels["Kotzebue: Medium"] == 12
+    assert list(dropped.text) == ["Newville: (dropped)"]
+
+
+def test_map_without_compare_has_no_highlight(vintage_2019):
+    figure = application.update_map_colors("Risk Level", None, "Current", *published)
+    assert len(figure["data"]) == 1
+    assert figure["data"][0].marker.size == 15
+
+
+def test_table_highlights_changes(vintage_2019):
+    records, styles = application.update_graph(
+        ["Nome", "Bethel", "Newville"], vintage_2019, "Current", *published
+    )
+    assert [r["Community"] for r in records] == ["Nome", "Bethel", "Newville"]
+    assert styles == [
+        {
+            "if": {
+                "filter_query": '{Community} = "Nome"',
+                "column_id": "Massive Ice Table",
+            },
+            "backgroundColor": application.changed_color,
+        },
+        {
+            "if": {"filter_query": '{Community} = "Bethel"'},
+            "backgroundColor": application.changed_color,
+        },
+        {
+            "if": {"filter_query": '{Community} = "Newville"'},
+            "backgroundColor": application.dropped_table_color,
+            "textDecoration": "line-through",
+        },
+    ]
+
+
+def test_table_highlights_only_selected_communities(vintage_2019):
+    records, styles = application.update_graph(
+        ["Nome"], vintage_2019, "Current", *published
+    )
+    assert [r["Community"] for r in records] == ["Nome"]
+    assert [style["if"]["filter_query"] for style in styles] == ['{Community} = "Nome"']
+
+
+def test_community_options_follow_vintages(vintage_2019):
+    def names(vintage, compare):
+        options = application.update_community_options(vintage, compare)
+        return {option["value"] for option in options}
+
+    assert "Newville" not in names("Current", None)
+    assert "Bethel" not in names(vintage_2019, None)
+    assert {"Newville", "Bethel"} <= names(vintage_2019, "Current")
+
+
+def test_table_without_compare_has_no_highlight(vintage_2019):
+    _, styles = application.update_graph(["Nome"], None, vintage_2019, *published)
+    assert styles == []